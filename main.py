@@ -1,12 +1,23 @@
 import asyncio
+import atexit
+import codecs
 import csv
+import importlib.util
+import io
 import logging
+import math
+import os
+import queue
 import re
-import json
+import sys
 from pathlib import Path
-from dataclasses import dataclass, fields, astuple
-from typing import Final, Any
+from dataclasses import dataclass, fields
+from functools import partial
+from logging.handlers import QueueHandler, QueueListener
+from operator import attrgetter
+from typing import Final, Any, Callable
 import httpx
+import orjson
 
 # TODO: 去除“立绘后缀"
 # TODO: 去除两个相同的skin_name
@@ -14,8 +25,9 @@ import httpx
 # --- 配置模块 ---
 
 # 可配置的常量
-CHAR_API_BASE_URL: Final[str] = "https://api.kivo.wiki/api/v1/data/students/{student_id}"
-SPINE_API_BASE_URL: Final[str] = "https://api.kivo.wiki/api/v1/data/spines/{spine_id}"
+# API 地址前缀，请求时直接拼接 ID
+CHAR_API_BASE_URL: Final[str] = "https://api.kivo.wiki/api/v1/data/students/"
+SPINE_API_BASE_URL: Final[str] = "https://api.kivo.wiki/api/v1/data/spines/"
 
 FINAL_STUDENT_ID: Final[int] = 566
 STUDENT_ID_RANGE: Final[range] = range(1, FINAL_STUDENT_ID + 1)
@@ -23,19 +35,60 @@ STUDENT_ID_RANGE: Final[range] = range(1, FINAL_STUDENT_ID + 1)
 OUTPUT_FILENAME: Final[str] = "students_data.csv"
 SKIPPED_FILENAME: Final[str] = "skipped_ids.csv"
 CACHE_DIR: Final[Path] = Path("cache")
+CSV_BUFFER_SIZE: Final[int] = 1 << 20
+# 后台缓存写入任务每次切换到线程时最多写入的文件数
+CACHE_WRITE_BATCH_SIZE: Final[int] = 32
 
 MAX_CONCURRENT_REQUESTS: Final[int] = 3
+# 两阶段流水线的 worker 数量：第一阶段获取学生数据，第二阶段获取 Spine 并解析。
+# 两者均多于并发请求数，使命中缓存的数据不必等待其他学生的网络请求
+NUM_STUDENT_FETCHERS: Final[int] = MAX_CONCURRENT_REQUESTS * 2
+NUM_SPINE_WORKERS: Final[int] = MAX_CONCURRENT_REQUESTS * 4
+# 限速：每 REQUEST_DELAY_SECONDS 秒内最多发出 MAX_REQUESTS_PER_PERIOD 个请求 (学生与 Spine 请求合计)
 REQUEST_DELAY_SECONDS: Final[float] = 2
+# 原先每个学生请求后等待 REQUEST_DELAY_SECONDS，其 Spine 请求 (平均约 3 个) 不受限速，
+# 合计约为每周期 MAX_CONCURRENT_REQUESTS * 4 个请求；统一限速沿用这一总量，不高于原先的请求速率
+MAX_REQUESTS_PER_PERIOD: Final[int] = MAX_CONCURRENT_REQUESTS * 4
+
+# HTTP 客户端配置
+USER_AGENT: Final[str] = "BA-characters-internal-id (https://github.com/Agent-0808/BA-characters-internal-id)"
+HTTP_TIMEOUT: Final[httpx.Timeout] = httpx.Timeout(10.0, connect=5.0)
+KEEPALIVE_EXPIRY_SECONDS: Final[float] = 60
+# 网络层错误（超时、连接失败或中断等）与限流响应的重试次数与指数退避区间，其他 HTTP 状态错误不重试。
+# 连接失败也由这里重试，传输层不再单独重试，避免两层重试次数相乘
+MAX_REQUEST_ATTEMPTS: Final[int] = 3
+RETRY_BACKOFF_MIN_SECONDS: Final[float] = 1
+RETRY_BACKOFF_MAX_SECONDS: Final[float] = 8
+# 视为服务端限流、需要退避后重试的状态码，以及对其 Retry-After 的最长等待时间
+RETRYABLE_STATUS_CODES: Final[frozenset[int]] = frozenset({429, 503})
+RETRY_AFTER_MAX_SECONDS: Final[float] = 60
+# 视为暂时性网络故障、需要重试的异常；协议不支持、重定向过多、解码失败等错误重试也无济于事
+RETRYABLE_REQUEST_ERRORS: Final[tuple[type[httpx.RequestError], ...]] = (
+    httpx.TimeoutException,
+    httpx.NetworkError,
+    httpx.RemoteProtocolError,
+)
+# HTTP/2 依赖可选的 h2 包 (pip install httpx[http2])，未安装时回退到 HTTP/1.1
+HTTP2_AVAILABLE: Final[bool] = importlib.util.find_spec("h2") is not None
 
 # 日志配置
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# 日志记录先放入队列，由后台线程写出到控制台，避免同步的控制台输出阻塞事件循环
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+_log_listener = QueueListener(_log_queue, _console_handler)
+_log_listener.start()
+# 退出时停止监听线程，确保队列中剩余的日志全部输出
+atexit.register(_log_listener.stop)
+logging.getLogger().addHandler(QueueHandler(_log_queue))
+logging.getLogger().setLevel(logging.INFO)
 # 设置 httpx 日志级别为 WARNING，以屏蔽 INFO 级别的成功请求日志
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
 # --- 数据结构定义 ---
 
-@dataclass
+@dataclass(slots=True)
 class StudentForm:
     """用于存储单个角色形态结构化数据的类"""
     file_id: str
@@ -51,7 +104,7 @@ class StudentForm:
     name_kr: str
 
 
-@dataclass
+@dataclass(slots=True)
 class SkippedRecord:
     """用于存储跳过的ID及其原因的类"""
     student_id: int = 0
@@ -72,12 +125,32 @@ class CacheManager:
         self.students_dir = base_dir / "students"
         self.spines_dir = base_dir / "spines"
         self._ensure_dirs()
+        # 缓存文件路径直接用字符串拼接，避免每次构建路径都创建 Path 对象
+        self._students_prefix = os.path.join(self.students_dir, "")
+        self._spines_prefix = os.path.join(self.spines_dir, "")
+        # 启动时扫描一次缓存目录，记录已缓存的 ID；未命中缓存时无需访问文件系统或切换线程
+        self._cached_student_ids = self._scan_cached_ids(self.students_dir)
+        self._cached_spine_ids = self._scan_cached_ids(self.spines_dir)
+        # 待写入的缓存：(ID 索引集合, ID, 文件路径, JSON 字节)，由后台任务批量写入，None 为结束标记
+        self._write_queue: asyncio.Queue[tuple[set[int], int, str, bytes] | None] = asyncio.Queue()
+        self._writer_task: asyncio.Task | None = None
 
     def _ensure_dirs(self):
         """确保缓存目录存在"""
         self.students_dir.mkdir(parents=True, exist_ok=True)
         self.spines_dir.mkdir(parents=True, exist_ok=True)
 
+    @staticmethod
+    def _scan_cached_ids(directory: Path) -> set[int]:
+        """扫描缓存目录，返回其中所有 {id}.json 文件的 ID"""
+        cached_ids: set[int] = set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                if ext == ".json" and stem.isdecimal():
+                    cached_ids.add(int(stem))
+        return cached_ids
+
     def _clean_student_data(self, json_data: dict[str, Any]) -> dict[str, Any]:
         """
         清洗学生数据，移除不需要的大文本字段以节省空间
@@ -108,77 +181,251 @@ class CacheManager:
 
         return json_data
 
-    async def get_student(self, student_id: int) -> dict | None:
-        """从缓存读取学生数据"""
-        file_path = self.students_dir / f"{student_id}.json"
-        return await self._read_json(file_path)
+    async def get_student_with_spines(self, student_id: int) -> tuple[dict | None, dict[int, dict]]:
+        """
+        从缓存读取学生数据，并在同一次线程切换中读取其引用的所有已缓存 Spine 数据。
+        返回 (学生数据, {spine_id: Spine 缓存数据})，未缓存的 Spine 不在字典中。
+        """
+        if student_id not in self._cached_student_ids:
+            return None, {}
+        file_path = f"{self._students_prefix}{student_id}.json"
+        return await asyncio.to_thread(self._read_student_with_spines_sync, file_path)
+
+    def _read_student_with_spines_sync(self, student_path: str) -> tuple[dict | None, dict[int, dict]]:
+        student_data = self._try_read_json_sync(student_path)
+        if not isinstance(student_data, dict) or not isinstance(data := student_data.get('data'), dict):
+            return student_data, {}
+
+        cached_spines: dict[int, dict] = {}
+        for spine_id in data.get('spine', []):
+            if not isinstance(spine_id, int) or spine_id not in self._cached_spine_ids:
+                continue
+            if spine_data := self._try_read_json_sync(f"{self._spines_prefix}{spine_id}.json"):
+                cached_spines[spine_id] = spine_data
+        return student_data, cached_spines
 
-    async def save_student(self, student_id: int, data: dict):
-        """清洗并保存学生数据到缓存"""
+    def save_student(self, student_id: int, data: dict):
+        """清洗学生数据并加入后台写入队列"""
         cleaned_data = self._clean_student_data(data)
-        file_path = self.students_dir / f"{student_id}.json"
-        await self._write_json(file_path, cleaned_data)
+        file_path = f"{self._students_prefix}{student_id}.json"
+        self._enqueue_write(self._cached_student_ids, student_id, file_path, cleaned_data)
 
     async def get_spine(self, spine_id: int) -> dict | None:
         """从缓存读取 Spine 数据"""
-        file_path = self.spines_dir / f"{spine_id}.json"
+        if spine_id not in self._cached_spine_ids:
+            return None
+        file_path = f"{self._spines_prefix}{spine_id}.json"
         return await self._read_json(file_path)
 
-    async def save_spine(self, spine_id: int, data: dict):
-        """保存 Spine 数据到缓存 (Spine 数据通常较小，不做额外清洗)"""
-        file_path = self.spines_dir / f"{spine_id}.json"
-        await self._write_json(file_path, data)
+    def save_spine(self, spine_id: int, data: dict):
+        """将 Spine 数据加入后台写入队列 (Spine 数据通常较小，不做额外清洗)"""
+        file_path = f"{self._spines_prefix}{spine_id}.json"
+        self._enqueue_write(self._cached_spine_ids, spine_id, file_path, data)
 
-    async def _read_json(self, path: Path) -> dict | None:
-        """异步读取 JSON 文件"""
-        if not path.exists():
-            return None
+    async def _read_json(self, path: str) -> dict | None:
+        """异步读取 JSON 文件，文件不存在或读取失败时返回 None"""
+        # 使用 asyncio.to_thread 避免文件IO阻塞事件循环
+        return await asyncio.to_thread(self._try_read_json_sync, path)
+
+    def _read_json_sync(self, path: str) -> dict:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+
+    def _try_read_json_sync(self, path: str) -> dict | None:
+        """同步读取 JSON 文件，文件不存在或读取失败时返回 None"""
+        # 直接打开文件，不存在时捕获异常，省去预先检查的一次 stat
         try:
-            # 使用 asyncio.to_thread 避免文件IO阻塞事件循环
-            return await asyncio.to_thread(self._read_json_sync, path)
+            return self._read_json_sync(path)
+        except FileNotFoundError:
+            return None
         except Exception as e:
             logging.warning(f"读取缓存失败 {path}: {e}")
             return None
 
-    def _read_json_sync(self, path: Path) -> dict:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    def start_writer(self):
+        """启动后台缓存写入任务，需在事件循环中调用"""
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._write_loop())
+
+    async def close(self):
+        """等待队列中剩余的缓存全部写入后停止后台任务"""
+        if self._writer_task is None:
+            return
+        self._write_queue.put_nowait(None)
+        await self._writer_task
+        self._writer_task = None
 
-    async def _write_json(self, path: Path, data: dict):
-        """异步写入紧凑格式 JSON"""
+    def _enqueue_write(self, cached_ids: set[int], item_id: int, path: str, data: dict):
+        """序列化数据并放入写入队列，调用方无需等待磁盘 IO"""
         try:
-            await asyncio.to_thread(self._write_json_sync, path, data)
+            # orjson 直接输出紧凑的 UTF-8 字节 (无多余空格，不转义非 ASCII 字符)
+            payload = orjson.dumps(data)
         except Exception as e:
             logging.error(f"写入缓存失败 {path}: {e}")
+            return
+        self._write_queue.put_nowait((cached_ids, item_id, path, payload))
+
+    async def _write_loop(self):
+        """后台写入任务：每次取出队列中已有的若干项，在一次线程切换中全部写入"""
+        while True:
+            item = await self._write_queue.get()
+            batch = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= CACHE_WRITE_BATCH_SIZE or self._write_queue.empty():
+                    break
+                item = self._write_queue.get_nowait()
+
+            if batch:
+                written = await asyncio.to_thread(self._write_batch_sync, batch)
+                # 文件写入成功后才登记到索引
+                for cached_ids, item_id in written:
+                    cached_ids.add(item_id)
+
+            if item is None:
+                return
+
+    @staticmethod
+    def _write_batch_sync(batch: list[tuple[set[int], int, str, bytes]]) -> list[tuple[set[int], int]]:
+        """同步写入一批缓存文件，返回写入成功的 (ID 索引集合, ID)"""
+        written = []
+        for cached_ids, item_id, path, payload in batch:
+            try:
+                with open(path, 'wb') as f:
+                    f.write(payload)
+            except Exception as e:
+                logging.error(f"写入缓存失败 {path}: {e}")
+                continue
+            written.append((cached_ids, item_id))
+        return written
 
-    def _write_json_sync(self, path: Path, data: dict):
-        with open(path, 'w', encoding='utf-8') as f:
-            # 使用 separators 生成紧凑的 JSON (无多余空格)
-            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+class RateLimiter:
+    """
+    异步令牌桶限速器：在 time_period 秒内最多放行 max_rate 个请求。
+    与并发控制 (Semaphore) 相互独立，只负责控制整体请求速率。
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 1.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._rate_per_sec = max_rate / time_period
+        self._level: float = 0.0
+        self._last_check: float = 0.0
+        self._lock = asyncio.Lock()
+
+    def _leak(self):
+        """按经过的时间从桶中漏出令牌"""
+        now = asyncio.get_running_loop().time()
+        if self._level:
+            elapsed = now - self._last_check
+            self._level = max(self._level - elapsed * self._rate_per_sec, 0.0)
+        self._last_check = now
+
+    async def acquire(self):
+        """等待直到桶中有空余容量"""
+        # 持锁等待，保证等待者按先来后到的顺序获得令牌
+        async with self._lock:
+            while True:
+                self._leak()
+                if self._level + 1 <= self.max_rate:
+                    self._level += 1
+                    return
+                await asyncio.sleep((self._level + 1 - self.max_rate) / self._rate_per_sec)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info):
+        return None
 
 class APIClient:
     """负责处理所有网络请求及缓存管理的客户端"""
 
-    def __init__(self, client: httpx.AsyncClient, cache_manager: CacheManager):
+    def __init__(self, client: httpx.AsyncClient, cache_manager: CacheManager, semaphore: asyncio.Semaphore):
         self.client = client
         self.cache = cache_manager
-        
+        # 并发控制，只在实际发出 HTTP 请求时占用，命中缓存的读取不受限制
+        self.semaphore = semaphore
+        # 全局限速器，作用于每一次实际发出的 HTTP 请求
+        self.limiter = RateLimiter(max_rate=MAX_REQUESTS_PER_PERIOD, time_period=REQUEST_DELAY_SECONDS)
+        # 预先保存 URL 前缀，请求时只做字符串拼接
+        self._char_prefix: str = CHAR_API_BASE_URL
+        self._spine_prefix: str = SPINE_API_BASE_URL
+
+        # 本次运行中已获取的 spine 数据 (spine_id -> data)
+        self._spine_memo: dict[int, dict[str, Any]] = {}
+        # 正在加载中的 spine (spine_id -> 加载任务)
+        self._spine_inflight: dict[int, asyncio.Task[tuple[dict[str, Any] | None, str | None]]] = {}
+
         # 统计 API 请求次数
         self.student_req_count: int = 0
         self.spine_req_count: int = 0
 
-        self.client.headers.update({
-            "User-Agent": "BA-characters-internal-id (https://github.com/Agent-0808/BA-characters-internal-id)"
-        })
+    @staticmethod
+    def _extract_spine_data(cached_data: dict) -> dict[str, Any] | None:
+        """从缓存的完整响应中取出 spine 数据部分"""
+        if isinstance(cached_data, dict) and 'data' in cached_data:
+            return cached_data['data']
+        return cached_data
+
+    async def _get(self, url: str) -> httpx.Response:
+        """
+        发送经过并发控制与限速的 GET 请求。
+        暂时性网络错误与服务端限流 (429/503) 按指数退避重试，服务端给出 Retry-After 时以其为准；
+        重试耗尽后，网络错误抛出最后一次的异常，限流响应原样返回。
+        """
+        attempt = 1
+        while True:
+            try:
+                async with self.semaphore, self.limiter:
+                    response = await self.client.get(url)
+            except RETRYABLE_REQUEST_ERRORS as e:
+                if attempt >= MAX_REQUEST_ATTEMPTS:
+                    raise
+                reason = f"网络错误: {e}"
+                delay = self._backoff_delay(attempt)
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= MAX_REQUEST_ATTEMPTS:
+                    return response
+                reason = f"服务端限流 ({response.status_code})"
+                # Retry-After: 0 是有效值，只有缺失或无法解析时才退回指数退避
+                retry_after = self._retry_after_delay(response)
+                delay = self._backoff_delay(attempt) if retry_after is None else retry_after
+
+            # 退避等待时不占用并发名额
+            logging.warning(f"请求 {url} 时{reason}，{delay:g} 秒后重试 ({attempt}/{MAX_REQUEST_ATTEMPTS})")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def _backoff_delay(attempt: int) -> float:
+        """第 attempt 次失败后的指数退避时间"""
+        return min(RETRY_BACKOFF_MIN_SECONDS * 2 ** (attempt - 1), RETRY_BACKOFF_MAX_SECONDS)
+
+    @staticmethod
+    def _retry_after_delay(response: httpx.Response) -> float | None:
+        """解析以秒数表示的 Retry-After 响应头，无法解析时返回 None"""
+        try:
+            delay = float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            return None
+        # float() 也接受 "nan"/"inf"，其中 asyncio.sleep(nan) 永远不会返回，非有限值一律视为无法解析
+        if not math.isfinite(delay):
+            return None
+        return min(max(delay, 0.0), RETRY_AFTER_MAX_SECONDS)
 
     async def fetch_student_data(self, student_id: int) -> tuple[dict | None, str | None, bool]:
         """
         根据学生ID获取数据（优先查缓存）。
         返回 (数据, 错误/跳过原因, 是否命中缓存)。
         """
-        # 1. 尝试从缓存获取
-        if cached_data := await self.cache.get_student(student_id):
+        # 1. 尝试从缓存获取，已缓存的 spine 一并读出并放入内存，之后获取 spine 时无需再读文件
+        cached_data, cached_spines = await self.cache.get_student_with_spines(student_id)
+        if cached_data:
             logging.debug(f"ID {student_id}: 命中缓存")
+            for spine_id, spine_cache in cached_spines.items():
+                if spine_id not in self._spine_memo and (spine_data := self._extract_spine_data(spine_cache)) is not None:
+                    self._spine_memo[spine_id] = spine_data
             # 返回 True 表示命中缓存
             return cached_data, None, True
 
@@ -186,19 +433,20 @@ class APIClient:
         # 记录请求计数
         self.student_req_count += 1
         
-        url = CHAR_API_BASE_URL.format(student_id=student_id)
+        url = self._char_prefix + str(student_id)
         try:
-            response = await self.client.get(url, timeout=10.0)
+            response = await self._get(url)
             if response.status_code == 404:
                 # 未找到，未命中缓存
                 return None, "未找到 (404)", False
             response.raise_for_status()
             
-            json_data = response.json()
+            # 直接解析响应字节，跳过 httpx 的文本解码与标准库 json
+            json_data = orjson.loads(response.content)
             
             # 3. 成功获取后，保存到缓存
             if json_data and json_data.get('code') == 2000:
-                await self.cache.save_student(student_id, json_data)
+                self.cache.save_student(student_id, json_data)
             
             # 返回 False 表示来自 API 请求
             return json_data, None, False
@@ -211,28 +459,44 @@ class APIClient:
 
     async def fetch_spine_data(self, spine_id: int) -> tuple[dict[str, Any] | None, str | None]:
         """
-        根据 spine_id 获取 spine 数据（优先查缓存）。
-        注意：此函数暂不需要返回是否命中缓存，因为并发获取时不由它控制主延迟。
+        根据 spine_id 获取 spine 数据（优先查内存，其次本地缓存，最后请求 API）。
+        注意：此函数不需要返回是否命中缓存，请求速率由限速器统一控制。
         """
+        # 同一个 spine 可能被多个学生引用，本次运行中已获取过的直接返回
+        if (spine_data := self._spine_memo.get(spine_id)) is not None:
+            return spine_data, None
+
+        # 多个学生同时引用同一 spine 时，共用同一个进行中的加载任务，只发起一次请求
+        if (task := self._spine_inflight.get(spine_id)) is None:
+            task = asyncio.create_task(self._load_spine_data(spine_id))
+            self._spine_inflight[spine_id] = task
+            task.add_done_callback(lambda _: self._spine_inflight.pop(spine_id, None))
+
+        spine_data, error = await task
+        # 只记住成功的结果，失败的请求在下次引用时仍会重试
+        if spine_data is not None:
+            self._spine_memo[spine_id] = spine_data
+        return spine_data, error
+
+    async def _load_spine_data(self, spine_id: int) -> tuple[dict[str, Any] | None, str | None]:
+        """从本地缓存或 API 加载 spine 数据"""
         # 1. 尝试从缓存获取
         if cached_data := await self.cache.get_spine(spine_id):
-            if isinstance(cached_data, dict) and 'data' in cached_data:
-                return cached_data['data'], None
-            return cached_data, None 
+            return self._extract_spine_data(cached_data), None
 
         # 2. 缓存未命中，从 API 获取
         # 记录请求计数
         self.spine_req_count += 1
 
-        url = SPINE_API_BASE_URL.format(spine_id=spine_id)
+        url = self._spine_prefix + str(spine_id)
         try:
-            response = await self.client.get(url, timeout=10.0)
+            response = await self._get(url)
             response.raise_for_status()
-            json_response = response.json()
+            json_response = orjson.loads(response.content)
             
             if isinstance(json_response, dict) and 'data' in json_response:
                 # 3. 成功获取后，保存完整响应到缓存
-                await self.cache.save_spine(spine_id, json_response)
+                self.cache.save_spine(spine_id, json_response)
                 return json_response['data'], None
                 
             logging.warning(f"Spine ID {spine_id} 的响应格式无效: {json_response}")
@@ -248,6 +512,22 @@ class APIClient:
             logging.error(f"处理 Spine ID {spine_id} 时发生未知错误: {e}")
             return None, f"未知错误: {e}"
 
+def create_http_client() -> httpx.AsyncClient:
+    """
+    创建针对单一 API 主机调优的 HTTP 客户端：
+    连接池大小与并发数一致并保持长连接，可用时启用 HTTP/2 复用连接。
+    """
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_keepalive_connections=MAX_CONCURRENT_REQUESTS,
+            max_connections=MAX_CONCURRENT_REQUESTS,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=HTTP_TIMEOUT,
+        headers={"User-Agent": USER_AGENT},
+    )
+
 # --- 数据解析模块 ---
 
 class DataParser:
@@ -255,6 +535,7 @@ class DataParser:
 
     # 语言配置映射：(语言后缀, 是否包含皮肤名称)
     # key: 目标字段后缀, value: (JSON中的姓key, JSON中的名key, JSON中的皮肤key, 是否附加皮肤)
+    # 顺序与 StudentForm 中的名称字段一致，解析时按位置解包
     _LANG_CONFIG: Final[dict[str, tuple[str, str, str, bool]]] = {
         "full_name": ("family_name", "given_name", "skin", True), # 包含皮肤的完整名称
         "name": ("family_name", "given_name", "", False), # 不包含皮肤的基础名称
@@ -264,6 +545,70 @@ class DataParser:
         "en": ("family_name_en", "given_name_en", "", False), # EN 不包含皮肤
         "kr": ("family_name_kr", "given_name_kr", "", False), # KR 不包含皮肤
     }
+    # 固定为元组供解析时遍历，避免每次遍历字典；键名驻留后，与 JSON 解析出的键比较时可直接按对象身份命中
+    _LANG_ITEMS: Final[tuple[tuple[str, tuple[str, str, str, bool]], ...]] = tuple(
+        (sys.intern(lang_key), (sys.intern(fam_key), sys.intern(giv_key), sys.intern(skin_key), include_skin))
+        for lang_key, (fam_key, giv_key, skin_key, include_skin) in _LANG_CONFIG.items()
+    )
+
+    # 标准文件ID格式 (CH/NP + 4位数字)
+    _STANDARD_FILE_ID_RE: Final[re.Pattern[str]] = re.compile(r"(CH|NP)\d{4}", re.IGNORECASE)
+    _STANDARD_FILE_ID_PREFIXES: Final[frozenset[str]] = frozenset({"CH", "NP"})
+    # 非标准文件ID需要移除的前缀（小写，按顺序依次尝试）与后缀
+    _FILE_ID_PREFIXES: Final[tuple[str, ...]] = ("j_", "new_", "old_")
+    _FILE_ID_SUFFIXES: Final[tuple[str, ...]] = ("_spr", "_spr_update")
+
+    # 只接受spr类型
+    ACCEPT_SPINE_TYPES: Final[tuple[str, ...]] = ("spr",)
+    # 跳过包含特定关键词的形态
+    SPINE_KEYWORDS_TO_SKIP: Final[tuple[str, ...]] = ("toschool", "minori", "ui_raidboss")
+    # 跳过特定后缀的形态
+    SPINE_SUFFIXES_TO_SKIP: Final[tuple[str, ...]] = (
+        "_cn", "_steam", "_glitch_spr", "_cbt", "_halofix", "spr-2", "_old"
+    )
+
+    # 清洗后必然为空的备注，直接跳过正则处理
+    _IGNORED_REMARKS: Final[frozenset[str]] = frozenset({"初始立绘", "立绘", "差分"})
+
+    # Spine 备注的正则清洗规则列表（预编译，按顺序依次删除匹配内容）
+    _REMARK_CLEANUP_PATTERNS: Final[tuple[re.Pattern[str], ...]] = tuple(re.compile(pat) for pat in (
+        r"初始立绘",
+        r"立绘",
+        r"差分",
+        
+        # 强力清除：只要括号里包含类似年份或日期的数字结构，直接删掉整个括号
+        # 匹配：括号 -> 非括号内容 -> 2到4位数字接"年"或"." -> 非括号内容 -> 括号
+        # 这能搞定 (23.11.08之前), (2023年1月前)
+        r"[\(（][^\)）]*?\d{2,4}[年\.][^\)）]*?[\)）]",
+
+        # 清除裸露的日期串，并强制匹配后面的方位词
+        # 匹配：数字 -> 年/. -> 数字 -> [月/.] -> [日] -> [空格] -> [之前/之后/前/后/更新/版本修改]
+        r"\d{2,4}[年\.-]\d{1,2}[月\.-]\d{0,2}日?\s*(?:之?[前后]|更新|版本修改)?",
+
+        # 清除特定的状态词
+        r"[\(（](?:已)?更新至实装[\)）]",
+        r"修正版?",
+        r"更新",
+        r"(?i)\b(old|new|fixed|ver\.?\d*)\b",
+
+        # 删除 "旧" 和 "新"
+        r"[旧新]",
+
+        # 删除空括号
+        r"[\(（][\)）]",
+    ))
+    _DOUBLE_COMMA_RE: Final[re.Pattern[str]] = re.compile(r"[,，]\s*[,，]")
+    _BRACKET_TO_COMMA_RE: Final[re.Pattern[str]] = re.compile(r"[\(（]\s*([^)）]+?)\s*[\)）]")
+
+    # 特定替换规则列表
+    _REMARK_REPLACEMENT_RULES: Final[tuple[tuple[re.Pattern[str], str], ...]] = (
+        (re.compile(r"礼服(?:日奈|亚子)"), "礼服"),
+        (re.compile("西服"), "西装"),
+    )
+
+    def __init__(self) -> None:
+        # 备注清洗结果只取决于备注本身，按原始备注缓存，同一备注在各语言和各学生间只清洗一次
+        self._cleaned_remarks: dict[str, str] = {}
 
     # Student ID / 整体数据层面的处理 (最顶层验证与基础工具)
 
@@ -302,19 +647,25 @@ class DataParser:
         - 优先提取标准的 CHxxxx / NPxxxx 格式
         - 移除 new_, old_ 前缀和 _spr 等后缀
         """
-        # 1. 尝试直接提取标准格式 (CH/NP + 4位数字)
-        if match := re.search(r"(CH|NP)\d{4}", file_id, re.IGNORECASE):
+        # 1. 快速路径：以标准格式开头（最常见的情况），无需正则
+        if len(file_id) >= 6 and file_id[:2].upper() in self._STANDARD_FILE_ID_PREFIXES and file_id[2:6].isdecimal():
+            return file_id[:6].upper()
+
+        # 2. 尝试在任意位置提取标准格式 (CH/NP + 4位数字)
+        if match := self._STANDARD_FILE_ID_RE.search(file_id):
             return match.group(0).upper()
 
-        # 2. 否则手动清洗
+        # 3. 否则手动清洗
         cleaned_id = file_id.strip()
-        for prefix in ['J_', 'new_', 'old_']:
-            if cleaned_id.lower().startswith(prefix.lower()):
+        # 前缀不区分大小写：只转换一次小写，与原字符串同步切片
+        cleaned_lower = cleaned_id.lower()
+        for prefix in self._FILE_ID_PREFIXES:
+            if cleaned_lower.startswith(prefix):
                 cleaned_id = cleaned_id[len(prefix):]
+                cleaned_lower = cleaned_lower[len(prefix):]
 
-        for suffix in ['_spr', '_spr_update']:
-            if cleaned_id.endswith(suffix):
-                cleaned_id = cleaned_id.removesuffix(suffix)
+        for suffix in self._FILE_ID_SUFFIXES:
+            cleaned_id = cleaned_id.removesuffix(suffix)
             
         return cleaned_id.lower()
 
@@ -327,68 +678,56 @@ class DataParser:
         if not spine_item or not (name := spine_item.get("name")):
             return "缺少名称或数据无效"
 
-        name_lower = name.lower()
-
         # 只接受spr类型
-        ACCEPT_TYPES = ["spr"]
-        if (type_ := spine_item.get("type")) not in ACCEPT_TYPES:
+        if (type_ := spine_item.get("type")) not in self.ACCEPT_SPINE_TYPES:
             return f"类型 ({type_})"
+
+        # 类型检查通过后再转换小写，非 spr 类型无需这一步
+        name_lower = name.lower()
         
         # 跳过包含特定关键词的形态
-        SPINE_KEYWORDS_TO_SKIP: Final[list[str]] = ["toschool", "minori", "ui_raidboss"]
-        for keyword in SPINE_KEYWORDS_TO_SKIP:
+        for keyword in self.SPINE_KEYWORDS_TO_SKIP:
             if keyword in name_lower:
                 return f"包含 ({keyword})"
 
-        # 跳过特定后缀的形态
-        SPINE_SUFFIXES_TO_SKIP: Final[list[str]] = [
-            "_cn", "_steam", "_glitch_spr", "_cbt", "_halofix", "spr-2", "_old"
-        ]
-        for suffix in SPINE_SUFFIXES_TO_SKIP:
-            if name_lower.endswith(suffix):
-                return f"后缀 ({suffix.removeprefix('_')})"
+        # 跳过特定后缀的形态：先用元组形式的 endswith 一次性判断，命中后再确定具体后缀
+        if name_lower.endswith(self.SPINE_SUFFIXES_TO_SKIP):
+            suffix = next(s for s in self.SPINE_SUFFIXES_TO_SKIP if name_lower.endswith(s))
+            return f"后缀 ({suffix.removeprefix('_')})"
 
         return None
 
     def _process_spine_remark(self, remark: str | None, base_skin: str | None, name: str | None = None) -> str:
         """
-        处理 Spine 备注信息（核心正则清洗逻辑）
+        处理 Spine 备注信息：清洗后去掉与基础皮肤名或角色名重复的备注
         """
         if not remark:
             return ""
 
-        processed = remark
+        processed = self._cleaned_remarks.get(remark)
+        if processed is None:
+            processed = self._cleaned_remarks[remark] = self._clean_spine_remark(remark)
 
-        # 正则清洗规则列表
-        patterns = [
-            r"初始立绘",
-            r"立绘",
-            r"差分",
-            
-            # 强力清除：只要括号里包含类似年份或日期的数字结构，直接删掉整个括号
-            # 匹配：括号 -> 非括号内容 -> 2到4位数字接"年"或"." -> 非括号内容 -> 括号
-            # 这能搞定 (23.11.08之前), (2023年1月前)
-            r"[\(（][^\)）]*?\d{2,4}[年\.][^\)）]*?[\)）]",
-
-            # 清除裸露的日期串，并强制匹配后面的方位词
-            # 匹配：数字 -> 年/. -> 数字 -> [月/.] -> [日] -> [空格] -> [之前/之后/前/后/更新/版本修改]
-            r"\d{2,4}[年\.-]\d{1,2}[月\.-]\d{0,2}日?\s*(?:之?[前后]|更新|版本修改)?",
-
-            # 清除特定的状态词
-            r"[\(（](?:已)?更新至实装[\)）]",
-            r"修正版?",
-            r"更新",
-            r"(?i)\b(old|new|fixed|ver\.?\d*)\b",
-
-            # 删除 "旧" 和 "新"
-            r"[旧新]",
-
-            # 删除空括号
-            r"[\(（][\)）]",
-        ]
+        # 如果处理后的备注与该角色的基础皮肤名一致，则不重复添加
+        if base_skin and processed == base_skin:
+            return ""
+        # 如果处理后的备注与角色名相同，也不添加
+        if name and processed == name:
+            return ""
+
+        return processed
 
-        for pat in patterns:
-            processed = re.sub(pat, "", processed)
+    def _clean_spine_remark(self, remark: str) -> str:
+        """
+        清洗 Spine 备注（核心正则清洗逻辑），结果与角色无关
+        """
+        if remark in self._IGNORED_REMARKS:
+            return ""
+
+        processed = remark
+
+        for pattern in self._REMARK_CLEANUP_PATTERNS:
+            processed = pattern.sub("", processed)
 
         # 后处理：清理因删除单词留下的标点符号
         processed = processed.replace("()", "").replace("（）", "").strip()
@@ -396,37 +735,31 @@ class DataParser:
         # 移除开头和结尾的逗号/空格
         processed = processed.strip(",， ")
         # 移除中间可能出现的双逗号
-        processed = re.sub(r"[,，]\s*[,，]", ",", processed)
+        processed = self._DOUBLE_COMMA_RE.sub(",", processed)
         # 括号改为逗号分隔，例如"冬装（无围巾）"→"冬装,无围巾"
-        processed = re.sub(r"[\(（]\s*([^)）]+?)\s*[\)）]", r",\1", processed)
+        processed = self._BRACKET_TO_COMMA_RE.sub(r",\1", processed)
         processed = processed.strip(",，")
         
-        # 特定替换规则列表
-        replacement_rules = [
-            (r"礼服(?:日奈|亚子)", "礼服"),
-            ("西服", "西装"),
-        ]
-        
         # 应用替换规则
-        for pattern, replacement in replacement_rules:
-            processed = re.sub(pattern, replacement, processed)
-
-        # 如果处理后的备注与该角色的基础皮肤名一致，则不重复添加
-        if base_skin and processed == base_skin:
-            return ""
-        # 如果处理后的备注与角色名相同，也不添加
-        if name and processed == name:
-            return ""
+        for pattern, replacement in self._REMARK_REPLACEMENT_RULES:
+            processed = pattern.sub(replacement, processed)
 
         return processed
 
-    def _build_formatted_name(self, data: dict, lang_key: str, spine_remark: str) -> str:
-        """根据语言配置构建最终名称"""
-        fam_key, giv_key, skin_key, include_skin = self._LANG_CONFIG[lang_key]
-        
-        # 构建基础姓名
-        base_name = self._build_name(data.get(fam_key), data.get(giv_key))
-        
+    def _prepare_lang_bases(self, data: dict) -> list[tuple[str, str, bool]]:
+        """
+        预先计算各语言的 (基础姓名, 基础皮肤名, 是否附加皮肤)，顺序与 _LANG_CONFIG 一致。
+        这些值只取决于学生数据，同一学生的所有 Spine 共用一份。
+        """
+        get = data.get
+        build_name = self._build_name
+        return [
+            (build_name(get(fam_key), get(giv_key)), get(skin_key) or "", include_skin)
+            for _, (fam_key, giv_key, skin_key, include_skin) in self._LANG_ITEMS
+        ]
+
+    def _build_formatted_name(self, base_name: str, base_skin: str, include_skin: bool, spine_remark: str) -> str:
+        """根据语言的基础姓名与皮肤名构建最终名称"""
         # 如果连名字都没有（比如CN名字为空），直接返回空字符串
         if not base_name:
             return ""
@@ -436,7 +769,6 @@ class DataParser:
             return base_name
 
         # 处理皮肤名称
-        base_skin = data.get(skin_key) or ""
         processed_remark = self._process_spine_remark(spine_remark, base_skin, base_name)
         
         skin_parts = []
@@ -466,34 +798,57 @@ class DataParser:
             return [], [], skip_reason
 
         data = json_data['data']
+        get = data.get
         # 使用字典去重，key为标准化后的file_id
         forms_map: dict[str, StudentForm] = {}
         skipped_spines: list[SkippedRecord] = []
 
+        # 循环内反复调用的方法预先绑定为局部变量，省去每次的属性查找
+        build_name = self._build_name
+        build_formatted_name = self._build_formatted_name
+        get_spine_skip_reason = self._get_spine_skip_reason
+        normalize_file_id = self._normalize_file_id
+        process_spine_remark = self._process_spine_remark
+
         # 预先计算基础名称，用于 SkippedRecord
-        base_name_jp = self._build_name(data.get("family_name_jp"), data.get("given_name_jp"))
-        base_name_en = self._build_name(data.get("family_name_en"), data.get("given_name_en"))
-        default_name = self._build_name(data.get("family_name"), data.get("given_name"))
+        base_name_jp = build_name(get("family_name_jp"), get("given_name_jp"))
+        base_name_en = build_name(get("family_name_en"), get("given_name_en"))
+        default_name = build_name(get("family_name"), get("given_name"))
+
+        # 预先计算与 Spine 无关的各语言基础姓名和皮肤名
+        lang_bases = self._prepare_lang_bases(data)
+        base_skin = get("skin") or ""
+        # 没有 Spine 备注时各语言的名称相同，预先计算一次供所有无备注的 Spine 复用
+        plain_names = [
+            build_formatted_name(base_name, lang_skin, include_skin, "")
+            for base_name, lang_skin, include_skin in lang_bases
+        ]
+
+        # 同一学生的跳过记录共用这些基础字段
+        make_skipped = partial(
+            SkippedRecord,
+            student_id=kivo_wiki_id,
+            name=default_name,
+            name_jp=base_name_jp,
+            name_en=base_name_en,
+            school=get("school", "")
+        )
 
         for spine_item in spine_data:
             # 3.1 检查 Spine 是否跳过
-            if skip_reason := self._get_spine_skip_reason(spine_item):
-                skipped_spines.append(SkippedRecord(
-                    student_id=kivo_wiki_id,
+            if skip_reason := get_spine_skip_reason(spine_item):
+                skipped_spines.append(make_skipped(
                     spine_id=spine_item.get("id"),
-                    reason=skip_reason,
+                    # 跳过原因的取值种类很少，驻留后相同原因共享同一个字符串对象
+                    reason=sys.intern(skip_reason),
                     spine_name=spine_item.get("name"),
-                    spine_remark=spine_item.get("remark", ""),
-                    name=default_name, 
-                    name_jp=base_name_jp, 
-                    name_en=base_name_en, 
-                    school=data.get("school", "")
+                    spine_remark=spine_item.get("remark", "")
                 ))
                 continue
 
             spine_name_raw = spine_item["name"]
             # 处理 File ID
-            file_id = self._normalize_file_id(spine_name_raw)
+            file_id = normalize_file_id(spine_name_raw)
             
             if not file_id:
                 continue
@@ -502,31 +857,34 @@ class DataParser:
             spine_id = spine_item.get("id")
             spine_remark = spine_item.get("remark", "")
 
-            # 3.3 处理各种语言的名称 (内部调用 _process_spine_remark)
-            names = {
-                key: self._build_formatted_name(data, key, spine_remark)
-                for key in self._LANG_CONFIG
-            }
+            # 3.3 处理各种语言的名称 (内部调用 _process_spine_remark)，只有存在备注时才需要重新构建
+            if spine_remark:
+                names = [
+                    build_formatted_name(base_name, lang_skin, include_skin, spine_remark)
+                    for base_name, lang_skin, include_skin in lang_bases
+                ]
+            else:
+                names = plain_names
+            full_name, name, name_cn, name_jp, name_tw, name_en, name_kr = names
 
-            # 单独计算 skin_name 字段
-            base_skin = data.get("skin") or ""
-            processed_remark = self._process_spine_remark(spine_remark, base_skin, default_name)
-            # 使用推导式构建列表，自动过滤空字符串
-            skin_parts = [s for s in [base_skin, processed_remark] if s]
-            final_skin_str = ",".join(skin_parts)
+            # 单独计算 skin_name 字段：没有有效备注时即为基础皮肤名
+            if spine_remark and (processed_remark := process_spine_remark(spine_remark, base_skin, default_name)):
+                final_skin_str = f"{base_skin},{processed_remark}" if base_skin else processed_remark
+            else:
+                final_skin_str = base_skin
 
             form = StudentForm(
                 file_id=file_id,
                 char_id=kivo_wiki_id,
                 spine_id=spine_id,
-                full_name=names["full_name"],
-                name=names["name"],
+                full_name=full_name,
+                name=name,
                 skin_name=final_skin_str,
-                name_cn=names["cn"],
-                name_jp=names["jp"],
-                name_tw=names["tw"],
-                name_en=names["en"],
-                name_kr=names["kr"]
+                name_cn=name_cn,
+                name_jp=name_jp,
+                name_tw=name_tw,
+                name_en=name_en,
+                name_kr=name_kr
             )
 
             # --- 去重与合并逻辑 ---
@@ -549,189 +907,264 @@ class DataParser:
 # --- 文件输出模块 ---
 
 class CsvWriter:
-    """负责将处理好的数据写入CSV文件"""
+    """
+    负责将处理好的数据写入CSV文件。
+    处理过程中记录被逐批追加到临时文件，即使程序中途退出也能保留已处理的数据；
+    全部完成后再按排序键重排，写入最终文件。
+    """
 
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, dataclass_type: type, label: str, sort_key: Callable[[Any], Any]):
         self.filename = filename
+        self.partial_filename = f"{filename}.partial"
+        self.label = label
+        self.sort_key = sort_key
+        # 获取dataclass的字段名作为表头
+        self.header = [f.name for f in fields(dataclass_type)]
+        # 使用 attrgetter 直接按字段顺序取值，避免 astuple 的递归深拷贝
+        self._row_getter = attrgetter(*self.header)
+        # 内存中只保留 (排序键, 起始位置, 结束位置)，记录本身直接写入临时文件
+        self._sort_index: list[tuple[Any, int, int]] = []
+        # 临时文件当前已写入的字符数，用于定位每条记录编码后的文本
+        self._partial_length: int = 0
+        self._partial_file: io.TextIOWrapper | None = None
+        self._partial_writer: Any = None
 
     def _get_alternative_filename(self, original_filename: str) -> str:
         """生成备用文件名"""
         base, ext = original_filename.rsplit('.', 1)
         return f"{base}_backup.{ext}"
 
-    def write(self, data: list[StudentForm]):
-        """将StudentForm列表写入CSV文件"""
-        if not data:
-            logging.warning("没有可供写入的数据。")
-            return
+    def open(self):
+        """打开临时文件，准备逐批追加记录"""
+        self._partial_file = open(self.partial_filename, 'w', newline='', encoding='utf-8')
+        self._partial_writer = csv.writer(self._partial_file)
 
-        filenames_to_try = [self.filename, self._get_alternative_filename(self.filename)]
-
-        for filename in filenames_to_try:
-            try:
-                logging.info(f"开始将 {len(data)} 条记录写入到 {filename}...")
-                with open(filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                    # 获取dataclass的字段名作为表头
-                    header = [f.name for f in fields(StudentForm)]
-                    writer = csv.writer(csvfile)
-                    writer.writerow(header)
-                    # 使用推导式和astuple提高写入效率
-                    writer.writerows(astuple(form) for form in data)
-                logging.info(f"数据成功写入 {filename}。")
-                return  # 成功写入，退出函数
-            except IOError as e:
-                if filename == filenames_to_try[-1]:
-                    # 已经是最后一个文件名，仍然失败
-                    logging.error(f"写入文件 {filename} 时发生错误: {e}")
-                    logging.error("所有尝试的文件名均失败，数据未能保存。")
-                else:
-                    # 还有备用文件名可以尝试
-                    logging.warning(f"写入文件 {filename} 失败，可能是文件被占用，尝试使用备用文件名...")
-                    continue
+    def _require_partial_file(self) -> io.TextIOWrapper:
+        """返回已打开的临时文件，未调用 open() 时抛出异常"""
+        if self._partial_file is None:
+            raise RuntimeError(f"{self.label}的临时文件尚未打开，请先调用 open()")
+        return self._partial_file
 
-    def write_skipped(self, data: list[SkippedRecord]):
-        """将SkippedRecord列表写入CSV文件"""
-        if not data:
-            logging.warning("没有可供写入的跳过记录。")
+    def append(self, records: list):
+        """将一批记录追加到临时文件，并立即刷新"""
+        if not records:
             return
+        partial_file = self._require_partial_file()
+        for record in records:
+            # writerow 返回写入的字符数，据此记下该记录在临时文件中的位置
+            start = self._partial_length
+            self._partial_length += self._partial_writer.writerow(self._row_getter(record))
+            self._sort_index.append((self.sort_key(record), start, self._partial_length))
+        partial_file.flush()
+
+    def finalize(self):
+        """关闭临时文件，按排序键重排后写入最终CSV文件"""
+        self._require_partial_file().close()
+
+        # 记录已是编码好的 CSV 文本，按位置切片重排即可，无需再经 csv 模块解析和编码
+        with open(self.partial_filename, 'r', newline='', encoding='utf-8') as f:
+            partial_text = f.read()
+        # 起始位置作为第二排序键，相同排序键的记录保持追加时的顺序
+        self._sort_index.sort()
+
+        # 写入失败时保留临时文件，避免数据丢失
+        if self._write([partial_text[start:end] for _, start, end in self._sort_index]):
+            Path(self.partial_filename).unlink(missing_ok=True)
+
+    def _write(self, rows: list[str]) -> bool:
+        """将已排序、已编码的CSV行写入文件，失败时尝试备用文件名。返回数据是否已妥善处理"""
+        if not rows:
+            logging.warning(f"没有可供写入的{self.label}。")
+            return True
 
         filenames_to_try = [self.filename, self._get_alternative_filename(self.filename)]
 
         for filename in filenames_to_try:
             try:
-                logging.info(f"开始将 {len(data)} 条跳过记录写入到 {filename}...")
-                with open(filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                    # 获取dataclass的字段名作为表头
-                    header = [f.name for f in fields(SkippedRecord)]
-                    writer = csv.writer(csvfile)
-                    writer.writerow(header)
-                    # 使用推导式和astuple提高写入效率
-                    writer.writerows(astuple(record) for record in data)
-                logging.info(f"跳过记录成功写入 {filename}。")
-                return  # 成功写入，退出函数
+                logging.info(f"开始将 {len(rows)} 条{self.label}写入到 {filename}...")
+                # 以二进制模式打开并使用大缓冲区，手动写入 BOM 以兼容 Excel (等价于 utf-8-sig)
+                with open(filename, 'wb', buffering=CSV_BUFFER_SIZE) as raw_file:
+                    raw_file.write(codecs.BOM_UTF8)
+                    with io.TextIOWrapper(raw_file, encoding='utf-8', newline='', write_through=False) as csvfile:
+                        csv.writer(csvfile).writerow(self.header)
+                        csvfile.writelines(rows)
+                logging.info(f"{self.label}成功写入 {filename}。")
+                return True  # 成功写入，退出函数
             except IOError as e:
                 if filename == filenames_to_try[-1]:
                     # 已经是最后一个文件名，仍然失败
                     logging.error(f"写入文件 {filename} 时发生错误: {e}")
-                    logging.error("所有尝试的文件名均失败，跳过记录未能保存。")
+                    logging.error(f"所有尝试的文件名均失败，{self.label}未能保存，已处理的数据保留在 {self.partial_filename}。")
                 else:
                     # 还有备用文件名可以尝试
                     logging.warning(f"写入文件 {filename} 失败，可能是文件被占用，尝试使用备用文件名...")
                     continue
+        return False
 
 
 # --- 主逻辑与执行 ---
 
-async def process_student_id(
+async def process_student_data(
     student_id: int,
+    json_data: dict | None,
+    fetch_reason: str | None,
     client: APIClient,
-    parser: DataParser,
-    semaphore: asyncio.Semaphore
+    parser: DataParser
 ) -> tuple[int, list[StudentForm], list[SkippedRecord]]:
     """
-    获取、解析并处理单个学生ID的数据。
+    获取单个学生的 Spine 数据并解析，生成最终结果。
+    并发数与请求速率只在 APIClient 实际发出 HTTP 请求时受限，命中缓存的数据无需排队。
     """
-    async with semaphore:
-        all_skipped: list[SkippedRecord] = []
-        
-        # 获取数据，并得知来源是否为缓存
-        json_data, fetch_reason, from_cache = await client.fetch_student_data(student_id)
-        
-        # 如果数据不是来自缓存（即发起了网络请求），则执行延迟以礼貌对待 API
-        if not from_cache:
-            await asyncio.sleep(REQUEST_DELAY_SECONDS)
-
-        if not json_data:
-            # 在无法获取JSON数据时，创建一个包含基本信息的SkippedRecord
-            skipped = SkippedRecord(
-                student_id=student_id,
-                spine_id=None,
-                reason=fetch_reason or "未知网络原因",
-                spine_name=None, 
-                spine_remark=None,
-                name="", 
-                name_jp="", 
-                name_en="", 
-                school=""
-            )
-            return student_id, [], [skipped]
-
-        # 获取 spine 数据
-        spine_ids = json_data.get("data", {}).get("spine", [])
-        spine_tasks = [client.fetch_spine_data(sid) for sid in spine_ids if isinstance(sid, int)]
-        spine_results_raw = await asyncio.gather(*spine_tasks)
-        # 只提取成功获取的数据部分，忽略错误信息
-        spine_results = [data for data, error in spine_results_raw if data is not None]
-
-        forms, skipped_spines, student_skip_reason = parser.parse(json_data, student_id, spine_results)
-        all_skipped.extend(skipped_spines)
-
-        if student_skip_reason:
-            # 如果整个学生因规则被跳过，则从JSON数据中提取详细信息
-            data = json_data.get("data", {})
-            name = parser._build_name(data.get("family_name"), data.get("given_name")) or data.get("given_name_cn", "")
-            name_jp = parser._build_name(data.get("family_name_jp"), data.get("given_name_jp")) or ""
-            name_en = parser._build_name(data.get("family_name_en"), data.get("given_name_en")) or ""
-            school = data.get("school", "")
-
-            skipped = SkippedRecord(
-                student_id=student_id,
-                spine_id=None,
-                reason=student_skip_reason,
-                spine_name=None, 
-                spine_remark=None,
-                name=name,
-                name_jp=name_jp,
-                name_en=name_en,
-                school=school
-            )
-            all_skipped.append(skipped)
-
-        return student_id, forms, all_skipped
-
-async def main():
+    all_skipped: list[SkippedRecord] = []
+
+    if not json_data:
+        # 在无法获取JSON数据时，创建一个包含基本信息的SkippedRecord
+        skipped = SkippedRecord(
+            student_id=student_id,
+            spine_id=None,
+            reason=fetch_reason or "未知网络原因",
+            spine_name=None, 
+            spine_remark=None,
+            name="", 
+            name_jp="", 
+            name_en="", 
+            school=""
+        )
+        return student_id, [], [skipped]
+
+    # 获取 spine 数据
+    spine_ids = [sid for sid in json_data.get("data", {}).get("spine", []) if isinstance(sid, int)]
+    # 没有或只有一个 spine 时直接 await，省去 gather 为每个协程创建 Task 的开销
+    if not spine_ids:
+        spine_results_raw = []
+    elif len(spine_ids) == 1:
+        spine_results_raw = [await client.fetch_spine_data(spine_ids[0])]
+    else:
+        spine_results_raw = await asyncio.gather(*(client.fetch_spine_data(sid) for sid in spine_ids))
+    # 只提取成功获取的数据部分，忽略错误信息
+    spine_results = [data for data, error in spine_results_raw if data is not None]
+
+    forms, skipped_spines, student_skip_reason = parser.parse(json_data, student_id, spine_results)
+    all_skipped.extend(skipped_spines)
+
+    if student_skip_reason:
+        # 如果整个学生因规则被跳过，则从JSON数据中提取详细信息
+        data = json_data.get("data", {})
+        name = parser._build_name(data.get("family_name"), data.get("given_name")) or data.get("given_name_cn", "")
+        name_jp = parser._build_name(data.get("family_name_jp"), data.get("given_name_jp")) or ""
+        name_en = parser._build_name(data.get("family_name_en"), data.get("given_name_en")) or ""
+        school = data.get("school", "")
+
+        skipped = SkippedRecord(
+            student_id=student_id,
+            spine_id=None,
+            reason=student_skip_reason,
+            spine_name=None, 
+            spine_remark=None,
+            name=name,
+            name_jp=name_jp,
+            name_en=name_en,
+            school=school
+        )
+        all_skipped.append(skipped)
+
+    return student_id, forms, all_skipped
+
+async def student_fetcher(
+    id_queue: asyncio.Queue[int | None],
+    data_queue: asyncio.Queue[tuple[int, dict | None, str | None] | None],
+    client: APIClient
+):
+    """流水线第一阶段：从队列中持续取出学生ID并获取学生数据，直到遇到结束标记 None"""
+    while (student_id := await id_queue.get()) is not None:
+        json_data, fetch_reason, _ = await client.fetch_student_data(student_id)
+        await data_queue.put((student_id, json_data, fetch_reason))
+
+async def spine_worker(
+    data_queue: asyncio.Queue[tuple[int, dict | None, str | None] | None],
+    result_queue: asyncio.Queue[tuple[int, list[StudentForm], list[SkippedRecord]]],
+    client: APIClient,
+    parser: DataParser
+):
+    """流水线第二阶段：获取学生引用的 Spine 数据并解析，直到遇到结束标记 None"""
+    while (item := await data_queue.get()) is not None:
+        student_id, json_data, fetch_reason = item
+        result = await process_student_data(student_id, json_data, fetch_reason, client, parser)
+        await result_queue.put(result)
+
+async def main() -> None:
     """主执行函数"""
     semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
     parser = DataParser()
     cache_manager = CacheManager()
-    
-    all_student_forms: list[StudentForm] = []
-    skipped_records: list[SkippedRecord] = []
-
-    async with httpx.AsyncClient() as http_client:
-        # 将 cache_manager 注入 APIClient
-        client = APIClient(http_client, cache_manager)
-        student_ids = list(STUDENT_ID_RANGE)
-        total_count = len(student_ids)
-
-        tasks = [
-            process_student_id(student_id, client, parser, semaphore)
-            for student_id in student_ids
-        ]
+
+    # 按 char_id 和 file_id 排序以保证输出顺序稳定
+    writer = CsvWriter(OUTPUT_FILENAME, StudentForm, "记录", sort_key=attrgetter("char_id", "file_id"))
+    # 按 student_id 和 spine_id 排序以保证输出顺序稳定
+    skipped_writer = CsvWriter(SKIPPED_FILENAME, SkippedRecord, "跳过记录", sort_key=lambda x: (x.student_id, -1 if x.spine_id is None else x.spine_id))
+    # 处理结果在完成时即写入临时文件，不在内存中累积
+    writer.open()
+    skipped_writer.open()
+
+    async with create_http_client() as http_client:
+        # 将 cache_manager 与信号量注入 APIClient
+        client = APIClient(http_client, cache_manager, semaphore)
+        total_count = len(STUDENT_ID_RANGE)
+
+        # 有界队列：只让少量学生处于待处理状态，而不是一次性创建全部任务
+        id_queue: asyncio.Queue[int | None] = asyncio.Queue(maxsize=NUM_STUDENT_FETCHERS)
+        data_queue: asyncio.Queue[tuple[int, dict | None, str | None] | None] = asyncio.Queue(maxsize=NUM_SPINE_WORKERS)
+        result_queue: asyncio.Queue[tuple[int, list[StudentForm], list[SkippedRecord]]] = asyncio.Queue()
+
+        async def produce_ids() -> None:
+            for student_id in STUDENT_ID_RANGE:
+                await id_queue.put(student_id)
+            # 每个第一阶段 worker 一个结束标记
+            for _ in range(NUM_STUDENT_FETCHERS):
+                await id_queue.put(None)
+
+        async def run_student_fetchers() -> None:
+            await asyncio.gather(*(student_fetcher(id_queue, data_queue, client) for _ in range(NUM_STUDENT_FETCHERS)))
+            # 第一阶段全部结束后，为每个第二阶段 worker 放入结束标记
+            for _ in range(NUM_SPINE_WORKERS):
+                await data_queue.put(None)
+
+        async def collect_results() -> None:
+            for processed_count in range(1, total_count + 1):
+                student_id, forms_list, newly_skipped_records = await result_queue.get()
+
+                progress_prefix = f"[{processed_count}/{total_count}]"
+
+                if forms_list:
+                    # 成功提取到数据
+                    file_ids_str = ", ".join(form.file_id for form in forms_list)
+                    logging.info(f"{progress_prefix} ID: {student_id} -> 成功, File IDs: {file_ids_str}")
+                    writer.append(forms_list)
+
+                if newly_skipped_records:
+                    # 记录并打印跳过信息
+                    for skipped in newly_skipped_records:
+                        if skipped.spine_id:
+                            logging.info(f"{progress_prefix} ID: {student_id} -> Spine ID {skipped.spine_id} 已跳过 ({skipped.reason})")
+                        else:
+                            logging.info(f"{progress_prefix} ID: {student_id} -> 已跳过 ({skipped.reason})")
+                    skipped_writer.append(newly_skipped_records)
 
         logging.info(f"开始处理 {total_count} 个学生 ID (使用缓存路径: {CACHE_DIR})...")
 
-        processed_count = 0
-        for future in asyncio.as_completed(tasks):
-            processed_count += 1
-            student_id, forms_list, newly_skipped_records = await future
-
-            progress_prefix = f"[{processed_count}/{total_count}]"
-
-            if forms_list:
-                # 成功提取到数据
-                file_ids_str = ", ".join(form.file_id for form in forms_list)
-                logging.info(f"{progress_prefix} ID: {student_id} -> 成功, File IDs: {file_ids_str}")
-                all_student_forms.extend(forms_list)
-
-            if newly_skipped_records:
-                # 记录并打印跳过信息
-                for skipped in newly_skipped_records:
-                    if skipped.spine_id:
-                        logging.info(f"{progress_prefix} ID: {student_id} -> Spine ID {skipped.spine_id} 已跳过 ({skipped.reason})")
-                    else:
-                        logging.info(f"{progress_prefix} ID: {student_id} -> 已跳过 ({skipped.reason})")
-                skipped_records.extend(newly_skipped_records)
+        # 缓存文件由后台任务写入，获取数据的协程无需等待磁盘 IO
+        cache_manager.start_writer()
+        try:
+            # 任一协程出错时 gather 会立即抛出异常，不会因 worker 退出而卡在等待结果上
+            await asyncio.gather(
+                produce_ids(),
+                collect_results(),
+                run_student_fetchers(),
+                *(spine_worker(data_queue, result_queue, client, parser) for _ in range(NUM_SPINE_WORKERS)),
+            )
+        finally:
+            # 即使处理中途出错，也将已获取的数据写入缓存
+            await cache_manager.close()
         
         # 输出统计信息
         logging.info("-" * 40)
@@ -739,20 +1172,16 @@ async def main():
         logging.info(f"Spine 数据请求: {client.spine_req_count}")
 
 
-    # 按 file_id 排序以保证输出顺序稳定
-    all_student_forms.sort(key=lambda x: (x.char_id, x.file_id))
-
-    # 按 student_id 和 spine_id 排序以保证输出顺序稳定
-    skipped_records.sort(key=lambda x: (x.student_id, x.spine_id or -1))
-
-    # 写入文件
-    writer = CsvWriter(OUTPUT_FILENAME)
-    writer.write(all_student_forms)
-
-    # 写入跳过记录文件
-    skipped_writer = CsvWriter(SKIPPED_FILENAME)
-    skipped_writer.write_skipped(skipped_records)
+    # 排序并写入最终文件
+    writer.finalize()
+    skipped_writer.finalize()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # 可选依赖 uvloop (仅支持 Linux/macOS)：安装后使用基于 libuv 的事件循环，否则使用默认事件循环
+    try:
+        import uvloop  # type: ignore[import-not-found]
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())